@@ -12,12 +12,15 @@ the [Euphonic](https://github.com/pace-neutrons/Euphonic) package.
 """
 
 import io
+import mmap
+from functools import lru_cache
 
 # pylint: disable=invalid-name,too-few-public-methods
 import re
+import threading
 from pathlib import Path
-from struct import unpack
-from typing import Any, Collection, Dict, List, Optional, Tuple, Union
+from struct import Struct
+from typing import Any, Collection, Dict, Iterator, List, Optional, Tuple, Union
 
 import numpy as np
 
@@ -29,43 +32,142 @@ TYPE_MAP = {
     complex: "c16",
 }
 
+# Fortran record markers - compiled once rather than parsing the format per record
+_MARKER_STRUCT = Struct(">I")
+# Per-thread buffers reused for reading markers from streams
+_MARKER_BUFFERS = threading.local()
+# Section headers are upper case ASCII tags, blank-padded (and possibly quoted)
+_HEADER_TAG_RE = re.compile(rb"[\s']*([A-Z][A-Z0-9_%]*)[\s']*")
+_HEADER_START_BYTES = frozenset(b"ABCDEFGHIJKLMNOPQRSTUVWXYZ' ")
+# Structs for unpacking numerical scalars without creating intermediate arrays
+_SCALAR_STRUCTS = {
+    f"{ed}{dtype}": Struct(f"{ed}{code}")
+    for ed in "><"
+    for dtype, code in (("i4", "i"), ("f8", "d"))
+}
+
+
+@lru_cache(maxsize=128)
+def _get_dtype(type_string: str) -> np.dtype:
+    """Return the numpy dtype for a type string, cached to avoid parsing it again"""
+    return np.dtype(type_string)
+
+
+@lru_cache(maxsize=128)
+def _get_block_dtype(
+    layout: Tuple[Tuple[tuple, ...], ...]
+) -> Tuple[np.dtype, Tuple[int, ...]]:
+    """
+    Return the structured dtype of a block of records with the given layout,
+    including the record markers, and the payload size of each record
+    """
+    fields = []
+    payload_sizes = []
+    for irec, rec_fields in enumerate(layout):
+        fields.extend(
+            [(f"marker_{irec}", ">u4"), *rec_fields, (f"marker_end_{irec}", ">u4")]
+        )
+        payload_sizes.append(np.dtype(list(rec_fields)).itemsize)
+    return np.dtype(fields), tuple(payload_sizes)
+
+
+def _shape_size(shape) -> int:
+    """Number of elements of a shape - avoids the overhead of np.prod for short tuples"""
+    size = 1
+    for dim in shape:
+        size *= dim
+    return size
+
+
+@lru_cache(maxsize=256)
+def _get_suffix_pattern(name: str) -> "re.Pattern":
+    """Return the compiled pattern matching the numbered suffixes of a header"""
+    return re.compile(rf"{re.escape(name)}_(\d+)")
+
 
 class FieldType:
     """Abstract representation of the field type"""
 
+    __slots__ = ("name", "type_string", "_dtype", "_itemsize")
+
     def __init__(self, name, dtype, endian="BIG"):
         self.name = name
         ed = ">" if endian.lower() == "big" else "<"
         dtype = TYPE_MAP.get(dtype, dtype)
         self.type_string = f"{ed}{dtype}"
+        # Parse the type string once - it is fixed for the lifetime of the field
+        self._dtype = _get_dtype(self.type_string)
+        self._itemsize = self._dtype.itemsize
 
-    def decode(self, fp, decoded=None, record_data=None):
+    @property
+    def itemsize(self):
+        """Size of each element in bytes"""
+        return self._itemsize
+
+    @property
+    def nbytes(self):
+        """Size of the field in bytes, None if not known before decoding"""
+        return self._itemsize
+
+    def decode(self, fp, decoded=None, record_data=None, offset=0):
         """
         Decode the field with given file object or existing byte array
+
+        The `offset` is the position in bytes within the record data at which
+        the field starts.
         """
         _ = decoded
         if record_data is None:
             record_data, marker = _read_record(fp)
         else:
             marker = len(record_data)
-        count = marker // int(re.match(r"[><][a-z?]+(\d+)", self.type_string).group(1))
-        return np.frombuffer(record_data, np.dtype(self.type_string), count=count)
+        count = (marker - offset) // self._itemsize
+        return np.frombuffer(record_data, self._dtype, count=count, offset=offset)
 
 
 class CompositeField:
     """Composition field - multiple entities are stored in a single record"""
 
+    __slots__ = ("fields", "_sizes")
+
     def __init__(self, fields: List[FieldType]) -> None:
         super().__init__()
-        self.fields = fields
+        self.fields = tuple(fields)
+        # Size in bytes of each sub-field, None if it depends on the decoded data
+        self._sizes = [field.nbytes for field in fields]
+
+    def iter_layout(self, decoded_data):
+        """
+        Iterate over the sub-fields and their sizes in bytes
+
+        Sizes not known in advance are resolved using the decoded data at the
+        time the sub-field is reached.
+        """
+        for field, size in zip(self.fields, self._sizes):
+            if size is None:
+                size = field.itemsize * _shape_size(
+                    field.resolve_shape(decoded_data)[0]
+                )
+            assert size > 0
+            yield field, size
 
 
 class ScalarField(FieldType):
     """Abstract Representation of sclar type"""
 
-    def decode(self, fp, decoded=None, record_data=None):
-        array = super().decode(fp, decoded, record_data)
-        return array.tolist()[0]
+    __slots__ = ("_struct",)
+
+    def __init__(self, name, dtype, endian="BIG"):
+        super().__init__(name, dtype, endian)
+        self._struct = _SCALAR_STRUCTS.get(self.type_string)
+
+    def decode(self, fp, decoded=None, record_data=None, offset=0):
+        if self._struct is None:
+            array = super().decode(fp, decoded, record_data, offset)
+            return array[0].item()
+        if record_data is None:
+            record_data, _ = _read_record(fp)
+        return self._struct.unpack_from(record_data, offset)[0]
 
     @property
     def shape(self):
@@ -75,10 +177,12 @@ class ScalarField(FieldType):
 class SkippedField(FieldType):
     """A field that will be skipped"""
 
+    __slots__ = ()
+
     def __init__(self):
         super().__init__("None", dtype="i4")
 
-    def decode(self, fp, decoded=None, record_data=None):
+    def decode(self, fp, decoded=None, record_data=None, offset=0):
         """Recode - read the field the advance the stream"""
         _read_record(fp)
 
@@ -86,35 +190,61 @@ class SkippedField(FieldType):
 class ArrayField(ScalarField):
     """Abstract Representation of a Array type"""
 
+    __slots__ = (
+        "_shape",
+        "_symbolic_dims",
+        "_static_shape",
+        "_static_count",
+        "_native_dtype",
+    )
+
     def __init__(self, name, dtype, shape, endian="BIG"):
         """Instantiate an array field"""
         super().__init__(name, dtype, endian)
         self._shape = shape
+        # Positions and names of the dimensions given by previously decoded data
+        self._symbolic_dims = tuple(
+            (index, dim) for index, dim in enumerate(shape) if isinstance(dim, str)
+        )
+        # Numerical data is converted to native byte order once when decoded
+        self._native_dtype = None
+        if not self._dtype.isnative:
+            self._native_dtype = self._dtype.newbyteorder("=")
+        # Shapes without symbolic dimensions can be resolved once and for all
+        if not self._symbolic_dims:
+            self._static_shape = tuple(shape)
+            self._static_count = _shape_size(shape)
+        else:
+            self._static_shape = None
+            self._static_count = -1
 
     @property
     def shape(self):
         return self._shape
 
+    @property
+    def nbytes(self):
+        if self._static_shape is None:
+            return None
+        return self._itemsize * self._static_count
+
     def resolve_shape(self, data):
         """Resolve the shape of the array"""
-        shape = []
+        shape = list(self._shape)
         # Allow one dimension to be unresolved
         nunspec = 0
         missing = None
-        for val in self.shape:
-            if isinstance(val, str):
-                missing = val
-                val = data.get(val, -1)
-                if val == -1:
-                    nunspec += 1
-
-            shape.append(val)
+        for index, missing in self._symbolic_dims:
+            val = data.get(missing, -1)
+            if val == -1:
+                nunspec += 1
+            shape[index] = val
         if nunspec > 1:
             raise RuntimeError(f"Cannot resolve the shape: {shape}")
 
         return tuple(shape), missing
 
-    def decode(self, fp, decoded=None, record_data=None):
+    def decode(self, fp, decoded=None, record_data=None, offset=0):
         """
         Decode the array from the record
 
@@ -122,44 +252,49 @@ class ArrayField(ScalarField):
         stored in the decoded data. Search of the data can be either from a
         the file object, or from an buffer that is already read. The latter
         case is needed so composite record can be supported....
+
+        The returned array is Fortran-ordered, so it is not C-contiguous for
+        more than one dimension, and holds the data in native byte order.
         """
         if record_data is None:
             record_data, _ = _read_record(fp)
         if decoded is None:
             decoded = {}
-        shape, missing_dim = self.resolve_shape(decoded)
-        count = np.prod(shape)
+        if self._static_shape is not None:
+            shape, missing_dim = self._static_shape, None
+            count = self._static_count
+        else:
+            shape, missing_dim = self.resolve_shape(decoded)
+            count = _shape_size(shape)
         # Fully specified
         if count > 0:
-            array = np.frombuffer(record_data, np.dtype(self.type_string), count=count)
+            array = np.frombuffer(record_data, self._dtype, count=count, offset=offset)
         else:
             # Not fully specified - in this case we read the full record
-            array = np.frombuffer(record_data, np.dtype(self.type_string), count=-1)
-            # Work out the missing dimension...
-            tot = array.size
-            left = -tot / np.prod([elem for elem in shape if isinstance(elem, int)])
-            decoded[missing_dim] = int(left)
-            # Reconstruct the shape array
-            actual_shape = []
-            for elem in shape:
-                if elem == -1:
-                    actual_shape.append(int(left))
-                else:
-                    actual_shape.append(elem)
-            shape = actual_shape
+            array = np.frombuffer(record_data, self._dtype, count=-1, offset=offset)
+        # Byteswap the whole record in one pass rather than in every later operation
+        if self._native_dtype is not None:
+            array = array.astype(self._native_dtype)
+
+        # Fortran ordered data - the transpose of the reversed shape is a view.
+        # The unresolved dimension (-1), if any, is worked out by the reshape
+        array = array.reshape(tuple(shape)[::-1]).T
+        if -1 in shape:
+            decoded[missing_dim] = array.shape[shape.index(-1)]
 
         # Special case for 1D string array - return a list of strings
         if "a" in self.type_string and len(self.shape) == 1:
-            return [tmp.decode().strip() for tmp in array]
-        array = np.reshape(array, shape, order="F")
+            return [tmp.decode().strip() for tmp in array.tolist()]
         return array
 
 
 class StrField(ScalarField):
     """Abstract Representation of a Array type"""
 
-    def decode(self, fp, decoded=None, record_data=None):
-        bdata = super().decode(fp, decoded, record_data)
+    __slots__ = ()
+
+    def decode(self, fp, decoded=None, record_data=None, offset=0):
+        bdata = super().decode(fp, decoded, record_data, offset)
         return bdata.decode().strip()
 
 
@@ -172,17 +307,21 @@ class BoolField(ScalarField):
     identified as .FALSE.
     """
 
+    __slots__ = ()
+
     def __init__(self, name, endian="BIG"):
         super().__init__(name, "i4", endian)
 
-    def decode(self, fp, decoded=None, record_data=None):
-        val = super().decode(fp, decoded, record_data)
+    def decode(self, fp, decoded=None, record_data=None, offset=0):
+        val = super().decode(fp, decoded, record_data, offset)
         return bool(val)  # Anything !=0 is True
 
 
 class StructuredField:
     """A field that require case-by-case parsing"""
 
+    __slots__ = ("endian", "endian_sym")
+
     def __init__(self, endian="BIG"):
         self.endian = endian
         self.endian_sym = ">" if endian.lower() == "big" else "<"
@@ -191,27 +330,31 @@ class StructuredField:
 class EigenValueAndOccCompositeField(StructuredField):
     """Complex field for the eigenvalues and the occupations"""
 
+    __slots__ = ()
+
     def decode(self, fp, decoded_data, record_data=None):
         """Decode the occupation and eigenvalues field"""
         _ = record_data
         nbands = decoded_data["nbands"]
         nspin = decoded_data["nspins"]
         nkpts = decoded_data["nkpts"]
-        kpoints = np.zeros((3, nkpts))
-        occ = np.zeros((nbands, nkpts, nspin))
-        eigenvalues = np.zeros((nbands, nkpts, nspin))
-
-        # Now start reading
-        for ik in range(nkpts):
-            data, _ = _read_record(fp)
-            kpoints[:, ik] = np.frombuffer(data, self.endian_sym + "f8")
-            for idx_spin in range(nspin):
-                data, _ = _read_record(fp)
-                occ[:, ik, idx_spin] = np.frombuffer(data, self.endian_sym + "f8")
-                data, _ = _read_record(fp)
-                eigenvalues[:, ik, idx_spin] = np.frombuffer(
-                    data, self.endian_sym + "f8"
-                )
+        # All entries are written below - no need to zero-fill
+        kpoints = np.empty((3, nkpts))
+        occ = np.empty((nbands, nkpts, nspin))
+        eigenvalues = np.empty((nbands, nkpts, nspin))
+
+        # Each k-point is stored as a block of a k-point record followed by
+        # the occupancy and eigenvalue records of each spin
+        layout = [[("kpoint", self.endian_sym + "f8", (3,))]]
+        for idx_spin in range(nspin):
+            layout.append([(f"occ_{idx_spin}", self.endian_sym + "f8", (nbands,))])
+            layout.append([(f"eig_{idx_spin}", self.endian_sym + "f8", (nbands,))])
+        blocks = _read_fixed_records(fp, layout, nkpts)
+
+        kpoints[:] = blocks["kpoint"].T
+        for idx_spin in range(nspin):
+            occ[:, :, idx_spin] = blocks[f"occ_{idx_spin}"].T
+            eigenvalues[:, :, idx_spin] = blocks[f"eig_{idx_spin}"].T
         decoded_data["occupancies"] = occ
         decoded_data["eigenvalues"] = eigenvalues
         # Kpoints consistent with the order of eigenvalues and occupancies - as distribution of the
@@ -222,6 +365,8 @@ class EigenValueAndOccCompositeField(StructuredField):
 class ChargeDensityField(StructuredField):
     """For reading charge density"""
 
+    __slots__ = ()
+
     def decode(self, fp, decoded_data, record_data=None):
         """
         Decode the charge density
@@ -235,52 +380,49 @@ class ChargeDensityField(StructuredField):
         # Check if NCM
         has_ncm = decoded_data["spin_treatment"] == "VECTOR"
 
-        charge_density = np.zeros((ngx_fine, ngy_fine, ngz_fine), dtype=complex)
-        zcol = np.zeros(ngz_fine, dtype=complex)
-
+        # Each (nx, ny) column is stored as a single record
+        fields = [
+            ("nx", self.endian_sym + "i4"),
+            ("ny", self.endian_sym + "i4"),
+            ("charge", self.endian_sym + "c16", (ngz_fine,)),
+        ]
         if nspin == 2 and not has_ncm:
-            spin_density = np.zeros((ngx_fine, ngy_fine, ngz_fine), dtype=complex)
+            fields.append(("spin", self.endian_sym + "c16", (ngz_fine,)))
 
         if has_ncm:
-            spin_density = np.zeros((ngx_fine, ngy_fine, ngz_fine, 3), dtype=complex)
-
-        for _ in range(ngx_fine):
-            for _ in range(ngy_fine):
-                data, _ = _read_record(fp)
-                nx = np.frombuffer(data, self.endian_sym + "i4", offset=0, count=1)[0]
-                ny = np.frombuffer(data, self.endian_sym + "i4", offset=4, count=1)[0]
-                zcol = np.frombuffer(
-                    data, self.endian_sym + "c16", offset=8, count=ngz_fine
-                )
-                charge_density[nx - 1, ny - 1, :] = zcol
-                # For NSPIN = 2
-                if nspin == 2 and not has_ncm:
-                    spin_col = np.frombuffer(
-                        data,
-                        self.endian_sym + "c16",
-                        offset=8 + 16 * ngz_fine,
-                        count=ngz_fine,
-                    )
-                    spin_density[nx - 1, ny - 1, :] = spin_col
-                if has_ncm:
-                    spin_col = np.frombuffer(
-                        data,
-                        self.endian_sym + "c16",
-                        offset=8 + 16 * ngz_fine,
-                        count=ngz_fine * 3,
-                    )
-                    spin_density[nx - 1, ny - 1, :, :] = spin_col.reshape(
-                        (ngz_fine, 3), order="C"
-                    )
+            fields.append(("spin", self.endian_sym + "c16", (ngz_fine, 3)))
+
+        # All column records have the same size - read them in one go
+        records = _read_fixed_records(fp, [fields], ngx_fine * ngy_fine)
+        nx = records["nx"] - 1
+        ny = records["ny"] - 1
+        # CASTEP normally writes the columns in order, in which case no scatter is needed
+        in_order = np.array_equal(nx * ngy_fine + ny, np.arange(ngx_fine * ngy_fine))
 
         if nspin == 2 or has_ncm:
-            decoded_data["spin_density"] = spin_density
-        decoded_data["charge_density"] = charge_density
+            decoded_data["spin_density"] = self._columns_to_grid(
+                records["spin"], nx, ny, (ngx_fine, ngy_fine), in_order
+            )
+        decoded_data["charge_density"] = self._columns_to_grid(
+            records["charge"], nx, ny, (ngx_fine, ngy_fine), in_order
+        )
+
+    @staticmethod
+    def _columns_to_grid(columns, nx, ny, grid_shape, in_order):
+        """Place the decoded (nx, ny) columns on to the grid"""
+        shape = tuple(grid_shape) + columns.shape[1:]
+        if in_order:
+            return columns.reshape(shape).astype(complex)
+        grid = np.zeros(shape, dtype=complex)
+        grid[nx, ny] = columns
+        return grid
 
 
 class WaveFunctionField(StructuredField):
     """For reading the wave function"""
 
+    __slots__ = ()
+
     STORE_COEFFS = False
 
     @staticmethod
@@ -320,19 +462,18 @@ class WaveFunctionField(StructuredField):
                     nwaves,
                 ) = _decode_composite(fp, record_spec1)
                 nwaves_at_kp[ik] = nwaves
-                wavecoords_spec = ArrayField("grid", int, (nwaves,))
-                coeff_spec = ArrayField("coeff", complex, (nwaves,))
                 # Read the coordinates of the plane waves with the unit of the reciprocal lattice vectors
-                coords_x = wavecoords_spec.decode(fp)
-                coords_y = wavecoords_spec.decode(fp)
-                coords_z = wavecoords_spec.decode(fp)
-                pw_grid_coord[0, :nwaves, ik] = coords_x
-                pw_grid_coord[1, :nwaves, ik] = coords_y
-                pw_grid_coord[2, :nwaves, ik] = coords_z
-                for iband in range(nbands_max):
-                    for ispinor in range(spinorcomps):
-                        this_coeff = coeff_spec.decode(fp)
-                        coeffs[:nwaves, ispinor, iband, ik, ispin] = this_coeff
+                # - one record for each of the x, y and z components
+                coords = _read_fixed_records(fp, [[("grid", ">i4", (nwaves,))]], 3)
+                pw_grid_coord[:, :nwaves, ik] = coords["grid"]
+                # The coefficients of all bands and spinor components at this kpoint,
+                # one record each with the spinor component varying fastest
+                records = _read_fixed_records(
+                    fp, [[("coeff", ">c16", (nwaves,))]], nbands_max * spinorcomps
+                )
+                coeffs[:nwaves, :, :, ik, ispin] = (
+                    records["coeff"].reshape(nbands_max, spinorcomps, nwaves).T
+                )
 
         # Collect the data
         data = {
@@ -583,43 +724,68 @@ def read_castep_bin(
     """
 
     def _read_handle(f):
-        is_check, header_offset_map = _generate_header_offset_map(f)
+        is_check, header_offset_map = _generate_header_offset_map(
+            f, records_to_extract, spec
+        )
         f.seek(0)
 
         castep_data = {}
-        if spec is None:
+        _spec = spec
+        if _spec is None:
             _spec = CASTEP_CHECK_FIELD_SPEC if is_check else CASTEP_BIN_FIELD_SPEC
-        for header, field in _spec.items():
-
-            if (
-                records_to_extract
-                and header not in records_to_extract
-                and not header.startswith("CELL%")
-            ):
-                continue
-
+        headers = []
+        for header in _select_headers(_spec, records_to_extract):
             if header not in header_offset_map:
                 if records_to_extract and header in records_to_extract:
                     raise RuntimeError(
                         f"Unable to find desired header {header} in file."
                     )
                 continue
+            headers.append(header)
 
-            castep_data.update(
-                _decode_records(
-                    f,
-                    field,
-                    header_offset_map[header],
-                    castep_data,
-                )
-            )
+        # Decode in the order of the file so the stream only moves forward.
+        # The decoded data are stored into castep_data in place.
+        for header in sorted(headers, key=header_offset_map.get):
+            _decode_records(f, _spec[header], header_offset_map[header], castep_data)
         return castep_data
 
+    def _read_fileobj(fileobj):
+        """Map the file if possible, otherwise read it as a stream"""
+        # Map plain files only - wrappers such as gzip.GzipFile expose the descriptor
+        # of the underlying compressed file, so they must be read as streams
+        if not isinstance(getattr(fileobj, "raw", fileobj), io.FileIO):
+            return _read_handle(fileobj)
+        # Empty files and some file systems cannot be mapped
+        try:
+            mapped = _MappedFile(fileobj)
+        except (OSError, ValueError):
+            return _read_handle(fileobj)
+        return _read_handle(mapped)
+
     if filename is not None:
         with open(filename, mode="rb") as fhandle:
-            return _read_handle(fhandle)
+            return _read_fileobj(fhandle)
+    return _read_fileobj(fileobj)
+
 
-    return _read_handle(fileobj)
+def _select_headers(spec, records_to_extract: Optional[Collection[str]] = None):
+    """
+    Return the headers in the specification to be decoded
+
+    The cell headers are always included, since other records depend on
+    them, followed by the requested headers that have a specification.
+    """
+    if not records_to_extract:
+        return list(spec)
+    if isinstance(records_to_extract, str):
+        records_to_extract = (records_to_extract,)
+    headers = [header for header in spec if header.startswith("CELL%")]
+    headers.extend(
+        header
+        for header in dict.fromkeys(records_to_extract)
+        if header in spec and not header.startswith("CELL%")
+    )
+    return headers
 
 
 def _decode_records(
@@ -652,7 +818,8 @@ def _decode_records(
     """
     if decoded_data is None:
         decoded_data = {}
-    fp.seek(offset)
+    if fp.tell() != offset:
+        fp.seek(offset)
     for record_spec in record_specs:
         if isinstance(record_spec, FieldType):
             if isinstance(record_spec, SkippedField):
@@ -664,15 +831,13 @@ def _decode_records(
         elif isinstance(record_spec, CompositeField):
             # Read the decoded data
             record_data, _ = _read_record(fp)
-            for subspec in record_spec.fields:
-                offset = int(subspec.type_string[-1])
-                if isinstance(subspec, ArrayField):
-                    offset *= np.prod(subspec.resolve_shape(decoded_data)[0])
-                assert offset > 0
+            # Track the position of each sub-field rather than slicing the record
+            cursor = 0
+            for subspec, size in record_spec.iter_layout(decoded_data):
                 decoded_data[subspec.name] = subspec.decode(
-                    fp, decoded_data, record_data=record_data
+                    fp, decoded_data, record_data=record_data, offset=cursor
                 )
-                record_data = record_data[offset:]
+                cursor += size
         elif isinstance(record_spec, StructuredField):
             record_spec.decode(fp, decoded_data)
 
@@ -683,17 +848,16 @@ def _decode_composite(fp, record_spec):
     """Decode a composite field return the decoded data"""
     record_data, _ = _read_record(fp)
     decoded = []
-    for subspec in record_spec.fields:
-        offset = int(subspec.type_string[-1])
-        if isinstance(subspec, ArrayField):
-            offset *= np.prod(subspec.shape)
-        assert offset > 0
-        decoded.append(subspec.decode(fp, {}, record_data=record_data))
-        record_data = record_data[offset:]
+    cursor = 0
+    for subspec, size in record_spec.iter_layout({}):
+        decoded.append(subspec.decode(fp, {}, record_data=record_data, offset=cursor))
+        cursor += size
     return decoded
 
 
-def _generate_header_offset_map(fileobj) -> Tuple[bool, Dict[str, int]]:
+def _generate_header_offset_map(
+    fileobj, records_to_extract: Optional[Collection[str]] = None, spec=None
+) -> Tuple[bool, Dict[str, int]]:
     """
     Scans a castep_bin/check file for recognisable headers, creating a
     dictionary of their byte-offsets within the file. The stored
@@ -701,6 +865,11 @@ def _generate_header_offset_map(fileobj) -> Tuple[bool, Dict[str, int]]:
     following the CASTEP header.
 
     :param fileobj: A file object from which the data should be read.
+    :param records_to_extract: If given, the scan stops as soon as all of these
+        headers (and the cell headers that are always read with them) in the
+        field specification have been located.
+    :param spec: The field specification used to decide which headers are
+        needed. Defaults to that of the detected file type.
 
     :returns: Tuple of (is_check, offset_map), where the latter is a dictionary of
     headers mapped to the offsets of the following record.
@@ -712,37 +881,86 @@ def _generate_header_offset_map(fileobj) -> Tuple[bool, Dict[str, int]]:
 
     # Check first header is "CASTEP_BIN"
     header, _ = _read_record(f)
-    header = header.decode("utf-8").strip("'")
+    header = bytes(header).decode("utf-8").strip("'")
     is_check = False
     if header != "CASTEP_BIN":
         is_check = True
         f.seek(loc)
 
-    data = None
-    while data != "END":
-        data, _ = _read_record(f, seek_only=True)
-        try:
-            data = data.decode("utf-8").strip("'").strip()
-            # Strip any non-alpha fields
-            if data and data[0].isalpha() and data.upper() == data:
-                # Check if this header already exists
-                # for example, the cell information is written twice, one for the original cell
-                # and the other for the 'current' cell
-                if data in header_offset_map:
-                    data = _find_header_suffix(data, header_offset_map)
-
-                header_offset_map[data] = f.tell()
-        except (AttributeError, UnicodeDecodeError):
-            pass
+    remaining = None
+    if records_to_extract:
+        if spec is None:
+            spec = CASTEP_CHECK_FIELD_SPEC if is_check else CASTEP_BIN_FIELD_SPEC
+        remaining = set(_select_headers(spec, records_to_extract))
+
+    for data in _iter_records(f):
+        # Cheap first byte check to quickly skip records of numerical data
+        if not data or data[0] not in _HEADER_START_BYTES:
+            continue
+        # Classify the raw bytes - avoids decoding records of numerical data
+        match = _HEADER_TAG_RE.fullmatch(data)
+        if match is None:
+            continue
+        data = match.group(1).decode("ascii")
+        # Check if this header already exists
+        # for example, the cell information is written twice, one for the original cell
+        # and the other for the 'current' cell
+        if data in header_offset_map:
+            data = _find_header_suffix(data, header_offset_map)
+
+        header_offset_map[data] = f.tell()
+        if data == "END":
+            break
+        # Stop early once all the requested headers are located
+        if remaining is not None:
+            remaining.discard(data)
+            if not remaining:
+                break
 
     return is_check, header_offset_map
 
 
+def _read_fixed_records(
+    f: io.BufferedReader, layout: List[List[tuple]], count: int
+) -> np.ndarray:
+    """Read a run of consecutive records with a fixed, repeating layout.
+
+    The records are read with a single call and decoded as a structured array,
+    with the leading and trailing record markers included in the dtype.
+
+    Args:
+        f: The open binary file stream in the buffer.
+        layout: The structured dtype specification of each record in a
+            repeating block of records.
+        count: The number of blocks to read.
+
+    Returns:
+        A structured array with one element per block.
+
+    """
+    block_dtype, payload_sizes = _get_block_dtype(
+        tuple(tuple(rec_fields) for rec_fields in layout)
+    )
+    data = f.read(block_dtype.itemsize * count)
+    if len(data) < block_dtype.itemsize * count:
+        raise RuntimeError("Unexpected end of file while reading a record.")
+    blocks = np.frombuffer(data, block_dtype, count=count)
+    for irec, payload_size in enumerate(payload_sizes):
+        if np.any(blocks[f"marker_{irec}"] != payload_size) or np.any(
+            blocks[f"marker_end_{irec}"] != payload_size
+        ):
+            raise RuntimeError(
+                f"Record markers inconsistent with the expected record size ({payload_size})."
+            )
+    return blocks
+
+
 def _find_header_suffix(name, header_offset_map):
     """Found a suitable suffix the a given header name with number suffix"""
+    pattern = _get_suffix_pattern(name)
     counter = 1
     for key in header_offset_map.keys():
-        match = re.match(f"{name}_(\\d+)", key)
+        match = pattern.match(key)
         if match:
             num = int(match.group(1))
             if num >= counter:
@@ -774,15 +992,22 @@ def _read_record(
         record exceeded the chosen size.
 
     """
+    if isinstance(f, _MappedFile):
+        return f.read_record(seek_only, read_data_smaller_than)
     marker = _read_marker(f, record_marker_size=record_marker_size)
     data = None
     if marker <= read_data_smaller_than or not seek_only:
-        data = f.read(marker)
+        # Read the data together with the trailing marker in a single call
+        buffer = f.read(marker + _MARKER_STRUCT.size)
+        if len(buffer) != marker + _MARKER_STRUCT.size:
+            raise RuntimeError("Unexpected end of file while reading a record.")
+        data = memoryview(buffer)[:marker]
+        marker_end = _MARKER_STRUCT.unpack_from(buffer, marker)[0]
     else:
         # seek from current stream position (SEEK_CUR), indicated by the 1
         f.seek(marker, 1)
+        marker_end = _read_marker(f)
 
-    marker_end = _read_marker(f)
     if marker != marker_end:
         raise RuntimeError(
             f"The start ({marker}) and end ({marker_end}) record markers were inconsistent."
@@ -791,8 +1016,24 @@ def _read_record(
     return data, marker
 
 
+def _iter_records(
+    f: io.BufferedReader, read_data_smaller_than: int = 512
+) -> Iterator[Optional[bytes]]:
+    """
+    Step through consecutive records from the current position, yielding the
+    data of each as `_read_record` does with `seek_only=True`.
+    """
+    if isinstance(f, _MappedFile):
+        yield from f.iter_records(read_data_smaller_than)
+        return
+    while True:
+        yield _read_record(
+            f, seek_only=True, read_data_smaller_than=read_data_smaller_than
+        )[0]
+
+
 def _read_marker(
-    f: Union[io.BufferedReader, bytes], record_marker_size: int = 4
+    f: Union[io.BufferedReader, "_MappedFile", bytes], record_marker_size: int = 4
 ) -> int:
     """Read the next *n* bytes from the buffer and try to interpret them
     as a Fortran record marker (typically uint4, but can depend on
@@ -807,7 +1048,109 @@ def _read_marker(
 
     """
 
-    if isinstance(f, io.BufferedReader):
+    if isinstance(f, _MappedFile):
+        return f.unpack(_MARKER_STRUCT)[0]
+    if record_marker_size == _MARKER_STRUCT.size and hasattr(f, "readinto"):
+        # Read into a reused buffer rather than a new bytes object
+        buffer = getattr(_MARKER_BUFFERS, "buffer", None)
+        if buffer is None:
+            buffer = _MARKER_BUFFERS.buffer = bytearray(record_marker_size)
+        if f.readinto(buffer) != record_marker_size:
+            raise RuntimeError("Unexpected end of file while reading a record marker.")
+        return _MARKER_STRUCT.unpack_from(buffer)[0]
+    if hasattr(f, "read"):
         f = f.read(record_marker_size)
 
-    return unpack(">I", f[:record_marker_size])[0]
+    return _MARKER_STRUCT.unpack_from(f)[0]
+
+
+class _MappedFile:
+    """
+    Minimal read-only file-like wrapper around a memory-mapped file
+
+    Reads return zero-copy `memoryview` slices of the mapped file rather than
+    newly allocated `bytes`, so that `np.frombuffer` can reference the file
+    data directly. The mapping is kept alive by any array that views it.
+    """
+
+    def __init__(self, fileobj):
+        self._view = memoryview(mmap.mmap(fileobj.fileno(), 0, access=mmap.ACCESS_READ))
+        self._pos = fileobj.tell()
+
+    def read(self, size: int = -1) -> memoryview:
+        """Read up to `size` bytes, or to the end of file if negative"""
+        start = self._pos
+        end = len(self._view) if size < 0 else min(start + size, len(self._view))
+        self._pos = end
+        return self._view[start:end]
+
+    def read_record(
+        self, seek_only: bool = False, read_data_smaller_than: int = 512
+    ) -> Tuple[Optional[memoryview], int]:
+        """
+        Read the Fortran record at the current position, see `_read_record`
+
+        Both markers are decoded in place and the payload is returned as a
+        view of the mapping, without going through the stream methods.
+        """
+        start = self._pos + 4
+        marker = _MARKER_STRUCT.unpack_from(self._view, self._pos)[0]
+        end = start + marker
+        marker_end = _MARKER_STRUCT.unpack_from(self._view, end)[0]
+        if marker != marker_end:
+            raise RuntimeError(
+                f"The start ({marker}) and end ({marker_end}) record markers were inconsistent."
+            )
+        self._pos = end + 4
+        if seek_only and marker > read_data_smaller_than:
+            return None, marker
+        return self._view[start:end], marker
+
+    def iter_records(
+        self, read_data_smaller_than: int = 512
+    ) -> Iterator[Optional[memoryview]]:
+        """
+        Step through consecutive records from the current position
+
+        Yields the payload of each record no larger than `read_data_smaller_than`
+        bytes and None for the others, with the position left just past the
+        record. The markers are unpacked directly from the mapping, so a scan
+        needs no per-record method calls.
+        """
+        view = self._view
+        unpack_from = _MARKER_STRUCT.unpack_from
+        cur = self._pos
+        while True:
+            marker = unpack_from(view, cur)[0]
+            start = cur + 4
+            cur = start + marker
+            marker_end = unpack_from(view, cur)[0]
+            if marker != marker_end:
+                raise RuntimeError(
+                    f"The start ({marker}) and end ({marker_end}) record markers were inconsistent."
+                )
+            self._pos = cur + 4
+            if marker > read_data_smaller_than:
+                yield None
+            else:
+                yield view[start:cur]
+            cur += 4
+
+    def unpack(self, struct: Struct) -> tuple:
+        """Unpack values in place at the current position and advance past them"""
+        values = struct.unpack_from(self._view, self._pos)
+        self._pos += struct.size
+        return values
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        """Change the stream position"""
+        if whence == io.SEEK_CUR:
+            offset += self._pos
+        elif whence == io.SEEK_END:
+            offset += len(self._view)
+        self._pos = offset
+        return self._pos
+
+    def tell(self) -> int:
+        """Return the current stream position"""
+        return self._pos
@@ -1,13 +1,22 @@
 """
 Module for reading OME_BIN/CST_OME file
 """
+from functools import lru_cache
+
 import numpy as np
-from scipy.io import FortranFile
 
-__all__ = ["read_ome_bin", "read_cst_ome", "read_dome_bin"]
+__all__ = ["read_ome_bin", "iter_ome_bin", "read_cst_ome", "read_dome_bin"]
+
+# Smaller runs of records are cheaper to read than to memory-map
+_MMAP_MIN_BYTES = 1 << 16
 
 
-def read_ome_bin(fname, num_bands, num_kpoints, num_spins, endian='big'):
+def read_ome_bin(fname,
+                 num_bands,
+                 num_kpoints,
+                 num_spins,
+                 endian='big',
+                 dtype=complex):
     """
     Read the `ome_bin` file.
 
@@ -20,6 +29,8 @@ def read_ome_bin(fname, num_bands, num_kpoints, num_spins, endian='big'):
         num_kpoints: Number of kpoints.
         num_spins: Number of spins.
         endian: Endian - CASTEP build instruction defaults to big-endian.
+        dtype: The dtype of the returned matrix, for example `np.complex64` to halve
+            its memory footprint at reduced precision.
 
     Returns:
         version: The version number stored in the file.
@@ -35,24 +46,72 @@ def read_ome_bin(fname, num_bands, num_kpoints, num_spins, endian='big'):
     array_seg = '{}(3,{num_bands},{num_bands})c16'.format(esymbol,
                                                           num_bands=num_bands)
 
-    om = np.zeros((num_spins, num_kpoints, 3, num_bands, num_bands),
-                  dtype=complex)
-    with FortranFile(fname, header_dtype=np.dtype(f'{esymbol}u4')) as fhandle:
-        version = fhandle.read_record(version_dtype)
-        header = fhandle.read_record(header_dtype)[0].decode()
+    with open(fname, 'rb') as fhandle:
+        version = _read_records(fhandle, version_dtype, 1, esymbol)
+        header = _read_records(fhandle, header_dtype, 1, esymbol)[0].decode()
+        # Records for each kpoint and spin have the same size - read them in one go
+        data = _read_records(fhandle, array_seg, num_kpoints * num_spins,
+                             esymbol)
+    # Swap the kpoint and spin axes and convert to the output dtype in a single copy
+    om = np.ascontiguousarray(data.reshape(num_kpoints, num_spins, 3,
+                                           num_bands, num_bands).swapaxes(0, 1),
+                              dtype=dtype)
+    return version[0], header, om
+
+
+def iter_ome_bin(fname,
+                 num_bands,
+                 num_kpoints,
+                 num_spins,
+                 endian='big',
+                 dtype=complex):
+    """
+    Iterate over the optical matrix in the `ome_bin` file one kpoint and spin at a time.
+
+    Unlike `read_ome_bin`, the full matrix is never held in memory - the records are read
+    one at a time as they are reached, so large files can be processed with the memory of
+    a single block.
+
+    Args:
+        fname: Name of the file.
+        num_bands: Number of bands.
+        num_kpoints: Number of kpoints.
+        num_spins: Number of spins.
+        endian: Endian - CASTEP build instruction defaults to big-endian.
+        dtype: The dtype of the yielded blocks.
+
+    Yields:
+        Tuples of (kpoint index, spin index, block) in the order stored in the file, where
+        the block has dimensions (3, num_bands, num_bands).
+    """
+
+    esymbol = '>' if endian.upper() == 'BIG' else '<'
+    version_dtype = '{}f8'.format(esymbol)
+    header_dtype = '{}a80'.format(esymbol)
+    array_seg = '{}(3,{num_bands},{num_bands})c16'.format(esymbol,
+                                                          num_bands=num_bands)
+
+    with open(fname, 'rb') as fhandle:
+        # Skip the version and header records
+        _read_records(fhandle, version_dtype, 1, esymbol)
+        _read_records(fhandle, header_dtype, 1, esymbol)
         for ki in range(num_kpoints):
             for si in range(num_spins):
-                om[si, ki, :, :, :] = fhandle.read_record(array_seg)
-    return version[0], header, om
+                block = _read_records(fhandle, array_seg, 1, esymbol)[0]
+                yield ki, si, np.array(block, dtype=dtype)
 
 
-def read_cst_ome(fname, num_bands, num_kpoints, num_spins, endian='big'):
+def read_cst_ome(fname,
+                 num_bands,
+                 num_kpoints,
+                 num_spins,
+                 endian='big',
+                 dtype=complex):
     """
     Read the `cst_ome` file.
 
     The `cst_ome` file contains the optical matrix elements generated by the `Spectral` task.
-    This is a legacy file format and has slow io, especially for python as one has to use nested
-    loops.
+    This is a legacy file format with each matrix element stored as a separate record.
 
     Note that we return the data in the 'C' order with dimensions (num_spins, num_kpoints, 3, num_bands, num_bands)
 
@@ -62,6 +121,8 @@ def read_cst_ome(fname, num_bands, num_kpoints, num_spins, endian='big'):
         num_kpoints: Number of kpoints.
         num_spins: Number of spins.
         endian: Endian - CASTEP build instruction defaults to big-endian.
+        dtype: The dtype of the returned matrix, for example `np.complex64` to halve
+            its memory footprint at reduced precision.
 
     Returns:
         om: Optical matrix with dimensions (num_spins, num_kpoins, 3, num_bands, num_bands)
@@ -72,22 +133,27 @@ def read_cst_ome(fname, num_bands, num_kpoints, num_spins, endian='big'):
     # double precision
     elem = '{}c16'.format(esymbol)
 
-    om = np.zeros((num_spins, num_kpoints, 3, num_bands, num_bands),
-                  dtype=complex)
-    with FortranFile(fname, header_dtype=np.dtype(f'{esymbol}u4')) as fhandle:
-        for ki in range(num_kpoints):
-            for si in range(num_spins):
-                for idx in range(3):
-                    for ib1 in range(num_bands):
-                        for ib2 in range(num_bands):
-                            om[si, ki, idx, ib1, ib2] = fhandle.read_record(
-                                elem)
-        out = fhandle._fp.read()  # pylint: disable=protected-access
+    with open(fname, 'rb') as fhandle:
+        # Each element is stored as a separate record - read all of them in one go
+        data = _read_records(fhandle,
+                             elem,
+                             num_kpoints * num_spins * 3 * num_bands * num_bands,
+                             esymbol)
+        out = fhandle.read()
         assert out == b"", "More data exist beyond the specified sizes."
+    # Swap the kpoint and spin axes and convert to the output dtype in a single copy
+    om = np.ascontiguousarray(data.reshape(num_kpoints, num_spins, 3,
+                                           num_bands, num_bands).swapaxes(0, 1),
+                              dtype=dtype)
     return om
 
 
-def read_dome_bin(fname, num_bands, num_kpoints, num_spins, endian="BIG"):
+def read_dome_bin(fname,
+                  num_bands,
+                  num_kpoints,
+                  num_spins,
+                  endian="BIG",
+                  dtype=float):
     """
     Read the `dome_bin` file.
 
@@ -101,6 +167,8 @@ def read_dome_bin(fname, num_bands, num_kpoints, num_spins, endian="BIG"):
         num_kpoints: Number of kpoints.
         num_spins: Number of spins.
         endian: Endian - CASTEP build instruction defaults to big-endian.
+        dtype: The dtype of the returned array, for example `np.float32` to halve
+            its memory footprint at reduced precision.
 
     Returns:
         version: The version number stored in the file.
@@ -115,11 +183,69 @@ def read_dome_bin(fname, num_bands, num_kpoints, num_spins, endian="BIG"):
     header_dtype = '{}a80'.format(esymbol)
     array_seg = '{}(3,{})f8'.format(esymbol, num_bands)
 
-    dom = np.zeros((num_spins, num_kpoints, 3, num_bands), dtype=float)
-    with FortranFile(fname, header_dtype=np.dtype(f'{esymbol}u4')) as fhandle:
-        version = fhandle.read_record(version_dtype)
-        header = fhandle.read_record(header_dtype)[0].decode()
-        for ki in range(num_kpoints):
-            for si in range(num_spins):
-                dom[si, ki, :, :] = fhandle.read_record(array_seg)
+    with open(fname, 'rb') as fhandle:
+        version = _read_records(fhandle, version_dtype, 1, esymbol)
+        header = _read_records(fhandle, header_dtype, 1, esymbol)[0].decode()
+        # Records for each kpoint and spin have the same size - read them in one go
+        data = _read_records(fhandle, array_seg, num_kpoints * num_spins,
+                             esymbol)
+    # Swap the kpoint and spin axes and convert to the output dtype in a single copy
+    dom = np.ascontiguousarray(data.reshape(num_kpoints, num_spins, 3,
+                                            num_bands).swapaxes(0, 1),
+                               dtype=dtype)
     return version[0], header, dom
+
+
+def _read_records(fp, dtype, count, esymbol):
+    """
+    Read consecutive Fortran records each holding a single item of `dtype`.
+
+    Large runs of records are memory-mapped, others are read with a single call,
+    and decoded as a structured array with the leading and trailing
+    record markers included, so the markers can be checked in bulk.
+
+    Args:
+        fp: The open binary file positioned at the first record.
+        dtype: The dtype of the data in each record.
+        count: The number of records to read.
+        esymbol: Endian symbol of the record markers.
+
+    Returns:
+        An array of the data with the records along the first axis.
+    """
+    rec_dtype = _record_dtype(dtype, esymbol)
+    dtype = rec_dtype['data']
+    start = fp.tell()
+    end = start + rec_dtype.itemsize * count
+    records = None
+    if end - start >= _MMAP_MIN_BYTES:
+        try:
+            # Map the records rather than reading them into an intermediate buffer
+            records = np.memmap(fp,
+                                rec_dtype,
+                                mode='r',
+                                offset=start,
+                                shape=(count, ))
+        except (AttributeError, OSError, ValueError):
+            fp.seek(start)
+    if records is None:
+        buffer = fp.read(end - start)
+        if len(buffer) < end - start:
+            raise RuntimeError('Unexpected end of file while reading a record.')
+        records = np.frombuffer(buffer, rec_dtype, count=count)
+    # Leave the file positioned after the records
+    fp.seek(end)
+    invalid = (records['head'] != dtype.itemsize) | (records['tail'] !=
+                                                      dtype.itemsize)
+    if invalid.any():
+        raise RuntimeError(
+            'Record markers inconsistent with the expected record size '
+            f'({dtype.itemsize}), first at record {np.argmax(invalid)}.')
+    return records['data']
+
+
+@lru_cache(maxsize=32)
+def _record_dtype(dtype, esymbol):
+    """Structured dtype of a record holding a single item of `dtype`, including the markers"""
+    marker = f'{esymbol}u4'
+    return np.dtype([('head', marker), ('data', dtype), ('tail', marker)])
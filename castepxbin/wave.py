@@ -2,9 +2,10 @@
 Functions for handling wave function related data
 """
 
-from typing import BinaryIO
+from typing import BinaryIO, Optional
 
 import numpy as np
+from scipy.fft import ifftn
 
 from .castep_bin import read_castep_bin
 
@@ -16,11 +17,9 @@ def coords_to_indices(grid_coords: np.ndarray, grid_size: np.ndarray):
     on to a reciprocal space grid.
     """
 
-    indices = grid_coords.copy()
     grid_size = np.asarray(grid_size)
     grid_size = grid_size[:, np.newaxis, np.newaxis]
-    indices = grid_coords % grid_size
-    return indices
+    return grid_coords % grid_size
 
 
 def coeff_to_recip(
@@ -30,6 +29,8 @@ def coeff_to_recip(
     ngx: int,
     ngy: int,
     ngz: int,
+    indices: Optional[np.ndarray] = None,
+    dtype=None,
 ):
     """
     Convert compact coefficient representation to a full reciprocal
@@ -37,31 +38,30 @@ def coeff_to_recip(
     that is ready to be inverse FFTed.
 
     :param coeffs: Plane wave coefficients, in the shape of (npw, nspinor, nb, nk, nspins)
+    :param indices: Grid indices of the plane waves as returned by `coords_to_indices`.
+        Computed from `grid_coords` if not given.
+    :param dtype: The dtype of the output grid. Defaults to the complex type matching the
+        precision of `coeffs`.
 
     :return: The plane wave coefficients on the grid, in the shape of (ngx, ngy, ngz, nspinor, nband, nk, nspins)
     """
 
     _, nspinor, band_max, nkpts, nspins = coeffs.shape
-    grid_size = (ngx, ngy, ngz)
-    indices = coords_to_indices(grid_coords, grid_size)
+    if indices is None:
+        indices = coords_to_indices(grid_coords, (ngx, ngy, ngz))
 
+    if dtype is None:
+        dtype = np.result_type(coeffs.dtype, np.complex64)
     grid = np.zeros(
-        (ngx, ngy, ngz, nspinor, band_max, nkpts, nspins), order="F", dtype=complex
+        (ngx, ngy, ngz, nspinor, band_max, nkpts, nspins), order="F", dtype=dtype
     )
-    for ispin in range(nspins):
-        for ik in range(nkpts):
-            for ib in range(band_max):
-                for ispinor in range(nspinor):
-                    for ipw in range(nwaves_at_kp[ik]):
-                        grid[
-                            indices[0, ipw, ik],
-                            indices[1, ipw, ik],
-                            indices[2, ipw, ik],
-                            ispinor,
-                            ib,
-                            ik,
-                            ispin,
-                        ] = coeffs[ipw, ispinor, ib, ik, ispin]
+    # Merge the three grid axes so each plane wave is addressed by a single index
+    flat_indices = np.ravel_multi_index(tuple(indices), (ngx, ngy, ngz), order="F")
+    flat_grid = grid.reshape((ngx * ngy * ngz,) + grid.shape[3:], order="F")
+    for ik in range(nkpts):
+        nwaves = nwaves_at_kp[ik]
+        # Scatter all bands, spinor components and spins of this kpoint at once
+        flat_grid[flat_indices[:nwaves, ik], :, :, ik, :] = coeffs[:nwaves, :, :, ik, :]
 
     return grid
 
@@ -71,6 +71,26 @@ class WaveFunction:  # pylint:disable=too-many-instance-attributes
     Class for handling the wave function
     """
 
+    __slots__ = (
+        "coeffs",
+        "nwave_max",
+        "nspinors",
+        "nbands",
+        "nkpts",
+        "nspins",
+        "data",
+        "fermi_energy",
+        "nwaves_at_kp",
+        "pw_grid_coords",
+        "mesh_size",
+        "kpts",
+        "pw_grid_indices",
+        "recip_lattice",
+        "real_lattice",
+        "occupancies",
+        "eigenvalues",
+    )
+
     def __init__(
         self,
         coeffs,
@@ -111,7 +131,7 @@ class WaveFunction:  # pylint:disable=too-many-instance-attributes
         self.eigenvalues = eigenvalues
         # Orbital files from bandstructure/spectral calculations do no contain occupancies
         # Here we naively occupy all states below the fermi level...
-        if self.occupancies.sum() == 0:
+        if not np.any(self.occupancies):
             self.occupancies[self.eigenvalues < self.fermi_energy] = 1.0
 
     @classmethod
@@ -151,13 +171,39 @@ class WaveFunction:  # pylint:disable=too-many-instance-attributes
             data = read_castep_bin(filename=fname)
         return cls.from_dict(data)
 
-    def get_reciprocal_grid(self) -> np.ndarray:
+    def get_reciprocal_grid(self, dtype=None) -> np.ndarray:
         """
         Return an on grid representation of the wavefunction
+
+        :param dtype: The dtype of the grid, defaults to the precision of the coefficients.
         """
 
         return coeff_to_recip(
-            self.coeffs, self.nwaves_at_kp, self.pw_grid_coords, *self.mesh_size
+            self.coeffs,
+            self.nwaves_at_kp,
+            self.pw_grid_coords,
+            *self.mesh_size,
+            indices=self.pw_grid_indices,
+            dtype=dtype,
+        )
+
+    def get_real_space_grid(self, workers: int = -1) -> np.ndarray:
+        """
+        Return the wavefunction on the real space grid
+
+        All spinor components, bands, kpoints and spins are transformed together as a
+        single batched inverse FFT over the first three axes.
+
+        The transform is not normalised: each point is the plane wave sum
+        `sum_G c_G exp(iG.r)`, without the `1/(ngx*ngy*ngz)` factor of `numpy.fft.ifftn`.
+        Divide by the number of grid points to recover the numpy convention.
+
+        :param workers: Number of threads used for the FFT, -1 uses all CPUs.
+
+        :returns: The wavefunction in the shape of (ngx, ngy, ngz, nspinor, nband, nk, nspins)
+        """
+        return ifftn(
+            self.get_reciprocal_grid(), axes=(0, 1, 2), norm="forward", workers=workers
         )
 
     def get_plane_wave_coeffs(self, ispin=0, ik=0, ib=0, ispinor=0):
@@ -178,6 +224,18 @@ class WaveFunction:  # pylint:disable=too-many-instance-attributes
         """
         return self.pw_grid_indices[:, : self.nwaves_at_kp[ik], ik]
 
+    def get_reciprocal_grid_for(self, ispin=0, ik=0, ib=0, ispinor=0) -> np.ndarray:
+        """
+        Return an on grid representation of a single state
+
+        Unlike `get_reciprocal_grid`, only the (ngx, ngy, ngz) grid of the requested
+        state is allocated.
+        """
+        grid = np.zeros(tuple(self.mesh_size), dtype=self.coeffs.dtype)
+        ix, iy, iz = self.get_gmesh_index(ik)
+        grid[ix, iy, iz] = self.get_plane_wave_coeffs(ispin, ik, ib, ispinor)
+        return grid
+
     def get_kpoints_cart(self):
         """
         Return the cartesian coordinates of the k-points
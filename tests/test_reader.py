@@ -1,14 +1,28 @@
 """
 Test the reader
 """
+import gzip
+import io
 import os
 
 import numpy as np
 import pytest
 import scipy.constants
 
-from castepxbin.castep_bin import read_castep_bin
-from castepxbin.ome_bin import read_cst_ome, read_dome_bin, read_ome_bin
+import castepxbin.castep_bin
+import castepxbin.ome_bin
+from castepxbin.castep_bin import (
+    CASTEP_CHECK_FIELD_SPEC,
+    ChargeDensityField,
+    _generate_header_offset_map,
+    read_castep_bin,
+)
+from castepxbin.ome_bin import (
+    iter_ome_bin,
+    read_cst_ome,
+    read_dome_bin,
+    read_ome_bin,
+)
 from castepxbin.pdos import (
     OrbitalEnum,
     SpinEnum,
@@ -18,11 +32,17 @@ from castepxbin.pdos import (
 from castepxbin.wave import coeff_to_recip, coords_to_indices
 
 
-@pytest.fixture
+@pytest.fixture(scope="session")
 def pdos_bin():
     return os.path.join(os.path.split(__file__)[0], "test_data/Si2.pdos_bin")
 
 
+@pytest.fixture(scope="session")
+def pdos_output(pdos_bin):
+    """Parsed pdos_bin shared by the tests - none of them modify it"""
+    return read_pdos_bin(pdos_bin)
+
+
 @pytest.fixture
 def ome_bin():
     return os.path.join(os.path.split(__file__)[0], "test_data/Si2.ome_bin")
@@ -65,13 +85,12 @@ def castep_bin_SiO2():
     return os.path.join(os.path.split(__file__)[0], "test_data/SiO2.castep_bin")
 
 
-def test_pdos_reader(pdos_bin):
+def test_pdos_reader(pdos_output):
     """Test the reader for pdos_bin"""
-    output = read_pdos_bin(pdos_bin)
-    assert output["pdos_weights"].shape == (8, 23, 110, 1)
+    assert pdos_output["pdos_weights"].shape == (8, 23, 110, 1)
 
 
-def test_pdos_reorder(pdos_bin):
+def test_pdos_reorder(pdos_output):
     """Test reordering of the PDOS"""
     try:
         from pymatgen.electronic_structure.core import (
@@ -81,12 +100,10 @@ def test_pdos_reorder(pdos_bin):
     except ImportError:
         pass
     else:
-        raw_output = read_pdos_bin(pdos_bin)
-        reordered = reorder_pdos_data(raw_output)
+        reordered = reorder_pdos_data(pdos_output)
         assert reordered[0][POrbital.s][PSpin.up].shape == (23, 110)
 
-    raw_output = read_pdos_bin(pdos_bin)
-    reordered = reorder_pdos_data(raw_output, pymatgen_labels=False)
+    reordered = reorder_pdos_data(pdos_output, pymatgen_labels=False)
     assert reordered[0][OrbitalEnum.s][SpinEnum.up].shape == (23, 110)
 
 
@@ -107,12 +124,29 @@ def test_castep_check_reader(castep_check_Si):
     grid = coeff_to_recip(
         wfc["coeffs"], wfc["nwaves_at_kp"], wfc["pw_grid_coords"], *mesh_size
     )
+    nwaves = wfc["nwaves_at_kp"][-1]
+    ix, iy, iz = idx[:, :nwaves, -1]
+    np.testing.assert_array_equal(
+        grid[ix, iy, iz, 0, :, -1, 0], wfc["coeffs"][:nwaves, 0, :, -1, 0]
+    )
+    assert np.count_nonzero(grid[..., -1, 0]) == np.count_nonzero(
+        wfc["coeffs"][:nwaves, ..., -1, 0]
+    )
 
     from castepxbin.wave import WaveFunction
 
     wf = WaveFunction.from_dict(data)
     mesh = wf.get_reciprocal_grid()
     assert all(mesh.shape[:3] == wf.mesh_size)
+    assert wf.get_reciprocal_grid(dtype=np.complex64).dtype == np.complex64
+    real = wf.get_real_space_grid()
+    assert real.shape == mesh.shape
+    # The inverse transform is not normalised
+    np.testing.assert_allclose(
+        real,
+        np.fft.ifftn(mesh, axes=(0, 1, 2)) * np.prod(wf.mesh_size),
+        atol=1e-12,
+    )
 
     assert wf.get_plane_wave_coeffs().size > 0
     assert (
@@ -125,6 +159,10 @@ def test_castep_check_reader(castep_check_Si):
     assert wf.get_gvectors(ik=wf.nkpts - 1).size > 0
     assert wf.get_gmesh_index().size > 0
     assert wf.get_gmesh_index(ik=wf.nkpts - 1).size > 0
+    np.testing.assert_array_equal(
+        wf.get_reciprocal_grid_for(ik=wf.nkpts - 1, ib=wf.nbands - 1),
+        mesh[:, :, :, 0, -1, -1, 0],
+    )
     assert isinstance(wf.get_kpoints_cart(), np.ndarray)
 
 
@@ -256,6 +294,154 @@ def test_castep_bin_reader(castep_bin_Si, castep_bin_SiO2):
     fobj.close()
 
 
+def test_castep_bin_stream(castep_bin_SiO2):
+    """Reading from a stream without a file descriptor gives the same data"""
+    mapped = read_castep_bin(castep_bin_SiO2)
+    with open(castep_bin_SiO2, "rb") as fhandle:
+        streamed = read_castep_bin(fileobj=io.BytesIO(fhandle.read()))
+    assert streamed.keys() == mapped.keys()
+    assert streamed["total_energy"] == mapped["total_energy"]
+    np.testing.assert_array_equal(streamed["forces"], mapped["forces"])
+    np.testing.assert_array_equal(streamed["charge_density"], mapped["charge_density"])
+
+
+def test_castep_bin_empty(tmp_path):
+    """Empty files are rejected the same way whether given by name or as a file object"""
+    empty = tmp_path / "empty.castep_bin"
+    empty.write_bytes(b"")
+    with pytest.raises(RuntimeError, match="Unexpected end of file"):
+        read_castep_bin(empty)
+    with open(empty, "rb") as fhandle:
+        with pytest.raises(RuntimeError, match="Unexpected end of file"):
+            read_castep_bin(fileobj=fhandle)
+
+
+def test_castep_bin_compressed(castep_bin_SiO2, tmp_path):
+    """Compressed file objects are read as streams rather than mapped"""
+    mapped = read_castep_bin(castep_bin_SiO2)
+    compressed = tmp_path / "SiO2.castep_bin.gz"
+    with open(castep_bin_SiO2, "rb") as fhandle:
+        compressed.write_bytes(gzip.compress(fhandle.read()))
+    with gzip.open(compressed, "rb") as fhandle:
+        streamed = read_castep_bin(fileobj=fhandle)
+    assert streamed["total_energy"] == mapped["total_energy"]
+    np.testing.assert_array_equal(streamed["forces"], mapped["forces"])
+
+
+@pytest.mark.parametrize(
+    "fixture, name",
+    [
+        ("castep_bin_SiO2", "charge"),
+        ("castep_bin_SiO2", "kpoint"),
+        ("castep_check_Si", "coeff"),
+    ],
+)
+@pytest.mark.parametrize("stream", [False, True])
+def test_castep_bin_truncated(request, monkeypatch, tmp_path, fixture, name, stream):
+    """A file truncated inside a run of records fails on the end of file"""
+    fname = request.getfixturevalue(fixture)
+    # Stop scanning for headers before the truncated part of the file
+    records = ("BEGIN_ELECTRONIC", "NKPTS_01", "END_CELL_GLOBAL_01")
+    # Locate the run of records holding the field
+    runs = []
+    read_fixed_records = castepxbin.castep_bin._read_fixed_records
+
+    def recorded(f, layout, count):
+        start = f.tell()
+        blocks = read_fixed_records(f, layout, count)
+        runs.append((blocks.dtype.names, start, f.tell()))
+        return blocks
+
+    monkeypatch.setattr(castepxbin.castep_bin, "_read_fixed_records", recorded)
+    read_castep_bin(fname, records_to_extract=records)
+    monkeypatch.undo()
+    start, end = next((start, end) for names, start, end in runs if name in names)
+
+    with open(fname, "rb") as fhandle:
+        data = fhandle.read((start + end) // 2)
+    truncated = tmp_path / "truncated"
+    truncated.write_bytes(data)
+    with pytest.raises(RuntimeError, match="Unexpected end of file"):
+        if stream:
+            read_castep_bin(fileobj=io.BytesIO(data), records_to_extract=records)
+        else:
+            read_castep_bin(truncated, records_to_extract=records)
+
+
+@pytest.mark.parametrize(
+    "nspins, spin_treatment, spin_shape",
+    [(1, "NONE", None), (2, "SCALAR", (4,)), (1, "VECTOR", (4, 3))],
+)
+def test_charge_density_out_of_order(nspins, spin_treatment, spin_shape):
+    """Columns written out of order are placed by their (nx, ny) indices"""
+    ngx, ngy, ngz = 2, 3, 4
+    rng = np.random.default_rng(0)
+    payload = [("nx", ">i4"), ("ny", ">i4"), ("charge", ">c16", (ngz,))]
+    if spin_shape:
+        payload.append(("spin", ">c16", spin_shape))
+    size = np.dtype(payload).itemsize
+    records = np.zeros(ngx * ngy, dtype=[("head", ">u4"), *payload, ("tail", ">u4")])
+    records["head"] = records["tail"] = size
+    columns = rng.permutation(ngx * ngy)
+    records["nx"] = columns // ngy + 1
+    records["ny"] = columns % ngy + 1
+    for name in ("charge", "spin") if spin_shape else ("charge",):
+        shape = records[name].shape
+        records[name] = rng.random(shape) + 1j * rng.random(shape)
+
+    decoded = {
+        "ngx_fine": ngx,
+        "ngy_fine": ngy,
+        "ngz_fine": ngz,
+        "nspins": nspins,
+        "spin_treatment": spin_treatment,
+    }
+    ChargeDensityField().decode(io.BytesIO(records.tobytes()), decoded)
+    nx, ny = records["nx"] - 1, records["ny"] - 1
+    assert decoded["charge_density"].shape == (ngx, ngy, ngz)
+    np.testing.assert_array_equal(decoded["charge_density"][nx, ny], records["charge"])
+    if spin_shape:
+        assert decoded["spin_density"].shape == (ngx, ngy) + spin_shape
+        np.testing.assert_array_equal(decoded["spin_density"][nx, ny], records["spin"])
+    else:
+        assert "spin_density" not in decoded
+
+    # The markers must match the size of the column records exactly
+    records["tail"][-1] = size + 16
+    with pytest.raises(RuntimeError, match="Record markers inconsistent"):
+        ChargeDensityField().decode(io.BytesIO(records.tobytes()), decoded)
+
+
+def test_castep_bin_partial_scan(castep_bin_SiO2):
+    """The header scan stops once the requested records are located"""
+    with open(castep_bin_SiO2, "rb") as fhandle:
+        _, offsets = _generate_header_offset_map(fhandle, ["FORCES"])
+    assert "FORCES" in offsets
+    assert "END" not in offsets
+
+    data = read_castep_bin(castep_bin_SiO2, records_to_extract=["FORCES"])
+    full = read_castep_bin(castep_bin_SiO2)
+    np.testing.assert_array_equal(data["forces"], full["forces"])
+    np.testing.assert_array_equal(data["real_lattice"], full["real_lattice"])
+
+
+def test_castep_bin_native_order(castep_bin_SiO2):
+    """Numerical arrays are returned in native byte order"""
+    data = read_castep_bin(castep_bin_SiO2)
+    assert data["forces"].dtype.isnative
+    assert data["ionic_positions"].dtype == np.float64
+
+
+def test_field_spec_slots():
+    """Field specifications should not carry a per-instance __dict__"""
+    for fields in CASTEP_CHECK_FIELD_SPEC.values():
+        assert isinstance(fields, tuple)
+        for field in fields:
+            assert not hasattr(field, "__dict__")
+            for subfield in getattr(field, "fields", ()):
+                assert not hasattr(subfield, "__dict__")
+
+
 def test_ome_bin(ome_bin):
     """Test reading ome_bin file"""
     v, header, om = read_ome_bin(ome_bin, 23, 2, 1)
@@ -264,6 +450,45 @@ def test_ome_bin(ome_bin):
     assert om.shape == (1, 2, 3, 23, 23)
     assert np.imag(om[0, 0, 1, 0, 0]) == pytest.approx(0.0)
 
+    _, _, om_single = read_ome_bin(ome_bin, 23, 2, 1, dtype=np.complex64)
+    assert om_single.dtype == np.complex64
+    np.testing.assert_allclose(om_single, om, rtol=1e-6, atol=1e-12)
+
+
+def test_ome_bin_mapped(ome_bin, monkeypatch):
+    """Memory-mapped and directly read records give the same data"""
+    _, _, om = read_ome_bin(ome_bin, 23, 2, 1)
+    monkeypatch.setattr(castepxbin.ome_bin, "_MMAP_MIN_BYTES", 0)
+    _, _, om_mapped = read_ome_bin(ome_bin, 23, 2, 1)
+    assert type(om_mapped) is np.ndarray
+    np.testing.assert_array_equal(om_mapped, om)
+
+
+@pytest.mark.parametrize("mmap_min_bytes", [0, 1 << 30])
+def test_iter_ome_bin(ome_bin, monkeypatch, mmap_min_bytes):
+    """Iterating over the blocks gives the same data as reading the whole file"""
+    _, _, om = read_ome_bin(ome_bin, 23, 2, 1)
+    monkeypatch.setattr(castepxbin.ome_bin, "_MMAP_MIN_BYTES", mmap_min_bytes)
+    blocks = list(iter_ome_bin(ome_bin, 23, 2, 1))
+    assert [(ki, si) for ki, si, _ in blocks] == [(0, 0), (1, 0)]
+    for ki, si, block in blocks:
+        assert block.shape == (3, 23, 23)
+        np.testing.assert_array_equal(block, om[si, ki])
+
+
+def test_ome_bin_inconsistent_size(ome_bin):
+    """Reading with the wrong number of bands fails on the record markers"""
+    with pytest.raises(RuntimeError, match="first at record 0"):
+        read_ome_bin(ome_bin, 22, 2, 1)
+
+
+@pytest.mark.parametrize("mmap_min_bytes", [0, 1 << 30])
+def test_ome_bin_truncated(ome_bin, monkeypatch, mmap_min_bytes):
+    """Asking for more records than stored fails on the end of file"""
+    monkeypatch.setattr(castepxbin.ome_bin, "_MMAP_MIN_BYTES", mmap_min_bytes)
+    with pytest.raises(RuntimeError, match="Unexpected end of file"):
+        read_ome_bin(ome_bin, 23, 3, 1)
+
 
 def test_cst_ome(cst_ome):
     """Test reading ome_bin file"""